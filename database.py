@@ -1,53 +1,363 @@
 # database.py
 
 import json
-from typing import List, Dict, Any
-from datetime import datetime
+import math
+import os
+from collections import defaultdict
+from typing import List, Dict, Any, Iterator, Set
+
+import numpy as np
+import orjson
+import pandas as pd
+
+from models import Phone
 
 # Define the path to the JSON database files
 PHONE_DATABASE_FILE = "phone_inventory.json"
+PHONE_JOURNAL_FILE = "phone_inventory.ndjson"
 LOG_DATABASE_FILE = "action_log.json"
+LOG_JOURNAL_FILE = "action_log.ndjson"
 
+# Bit assigned to each platform in the packed listed_mask column.
+PLATFORM_BIT = {"X": 1, "Y": 2, "Z": 4}
 
-# --- Phone Database Functions ---
-def load_phone_database() -> List[Dict[str, Any]]:
-    """Load the phone inventory from the JSON file."""
+# orjson serializes datetimes natively; naive ones are written as UTC.
+JSON_OPTIONS = orjson.OPT_NAIVE_UTC | orjson.OPT_SERIALIZE_NUMPY
+
+
+# --- Journal Helpers ---
+def _read_journal(path: str) -> Iterator[Dict[str, Any]]:
+    """Yield the entries of an NDJSON journal, skipping any torn line."""
     try:
-        with open(PHONE_DATABASE_FILE, "r") as f:
-            return json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
-        save_phone_database([])
+        with open(path, "rb") as f:
+            for line in f:
+                try:
+                    yield orjson.loads(line)
+                except orjson.JSONDecodeError:
+                    continue
+    except FileNotFoundError:
+        return
+
+
+def _read_snapshot(path: str) -> List[Dict[str, Any]]:
+    """
+    Read a JSON snapshot file, returning an empty list if it does not exist.
+
+    Snapshots written by older versions used the stdlib encoder, which emits
+    bare NaN tokens (e.g. for blank CSV cells) that orjson rejects, so those
+    are parsed with the stdlib decoder instead. A snapshot that cannot be
+    parsed at all raises, so it is never silently replaced by an empty one.
+    """
+    try:
+        with open(path, "rb") as f:
+            raw = f.read()
+    except FileNotFoundError:
         return []
+    if not raw.strip():
+        return []
+
+    try:
+        return orjson.loads(raw)
+    except orjson.JSONDecodeError:
+        pass
+    try:
+        return json.loads(raw)
+    except json.JSONDecodeError as exc:
+        raise ValueError(
+            f"Could not parse '{path}'; fix or move the file aside before starting."
+        ) from exc
+
+
+def _write_snapshot(path: str, data: List[Dict[str, Any]]):
+    """Atomically replace a JSON snapshot file."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(orjson.dumps(data, option=JSON_OPTIONS | orjson.OPT_INDENT_2))
+    os.replace(tmp_path, path)
+
+
+# --- Phone Database Functions ---
+def _repair_legacy_phone(phone: Dict[str, Any]):
+    """
+    Repair the values left by older CSV uploads in place.
+
+    Blank CSV cells used to be stored as NaN (null once re-saved), which the
+    indexes and the columnar view cannot handle, so they get empty defaults.
+    Specifications were stored as JSON strings and are parsed into dicts.
+    Records are streamed to clients without passing through the Phone model,
+    so they are also brought in line with its schema here: extra CSV columns
+    are dropped and values are coerced to the declared types.
+    """
+    for field in ("model_name", "brand", "condition"):
+        if not isinstance(phone.get(field), str):
+            phone[field] = ""
+    for field, field_type in (("stock_quantity", int), ("base_price", float)):
+        value = phone.get(field)
+        if not isinstance(value, (int, float)) or not math.isfinite(value):
+            value = 0
+        phone[field] = field_type(value)
+    for field, field_type in (
+        ("platform_prices", dict),
+        ("manual_overrides", dict),
+        ("listed_on", list),
+        ("tags", list),
+    ):
+        if not isinstance(phone.get(field), field_type):
+            phone[field] = field_type()
+    specifications = phone.get("specifications")
+    if isinstance(specifications, str):
+        try:
+            specifications = orjson.loads(specifications)
+        except orjson.JSONDecodeError:
+            specifications = {}
+    if not isinstance(specifications, dict):
+        specifications = {}
+    phone["specifications"] = {
+        str(k): str(v) for k, v in specifications.items() if v is not None
+    }
+
+    for field in phone.keys() - Phone.__fields__.keys():
+        del phone[field]
+
+
+def load_phone_database() -> List[Dict[str, Any]]:
+    """
+    Load the phone inventory from the JSON snapshot, replay the journal on
+    top of it and compact the result back into the snapshot.
+    """
+    snapshot = _read_snapshot(PHONE_DATABASE_FILE)
+    phones = {p["id"]: p for p in snapshot}
+    for entry in _read_journal(PHONE_JOURNAL_FILE):
+        if entry["op"] == "put":
+            phones[entry["id"]] = entry["data"]
+        elif entry["op"] == "patch":
+            if entry["id"] in phones:
+                phones[entry["id"]].update(entry["data"])
+        elif entry["op"] == "del":
+            phones.pop(entry["id"], None)
+
+    data = list(phones.values())
+    for phone in data:
+        _repair_legacy_phone(phone)
+    save_phone_database(data)
+    return data
 
 
 def save_phone_database(data: List[Dict[str, Any]]):
-    """Save the phone inventory to the JSON file."""
-    with open(PHONE_DATABASE_FILE, "w") as f:
-        json.dump(data, f, indent=4)
+    """
+    Compact the phone inventory into the JSON snapshot and reset the journal.
 
+    Only use this for changes that touch every phone; single-phone changes
+    should go through append_phone_record.
+    """
+    _write_snapshot(PHONE_DATABASE_FILE, data)
+    open(PHONE_JOURNAL_FILE, "w").close()
+
+
+def append_phone_record(record: Dict[str, Any]):
+    """
+    Append a change record to the phone inventory journal.
+
+    Records are {"op": "put", "id": ..., "data": {...}} to store a whole phone,
+    {"op": "patch", "id": ..., "data": {...}} to update some of its fields, or
+    {"op": "del", "id": ...} to delete it.
+    """
+    with open(PHONE_JOURNAL_FILE, "ab") as f:
+        f.write(orjson.dumps(record, option=JSON_OPTIONS) + b"\n")
 
-# --- Action Log Database Functions ---
-def default_converter(o):
-    if isinstance(o, datetime):
-        return o.isoformat()
 
+def append_phone_records(records: List[Dict[str, Any]]):
+    """Append several change records to the phone inventory journal at once."""
+    with open(PHONE_JOURNAL_FILE, "ab") as f:
+        f.write(b"".join(orjson.dumps(r, option=JSON_OPTIONS) + b"\n" for r in records))
 
+
+# --- Action Log Database Functions ---
 def load_log_database() -> List[Dict[str, Any]]:
-    """Load the action log from the JSON file."""
-    try:
-        with open(LOG_DATABASE_FILE, "r") as f:
-            return json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
-        save_log_database([])
-        return []
+    """
+    Load the action log (oldest first) from the JSON snapshot, add the entries
+    from the journal and compact the result back into the snapshot.
+    """
+    snapshot = _read_snapshot(LOG_DATABASE_FILE)
+    # A crash between writing the snapshot and truncating the journal leaves
+    # entries that are already compacted; skip them so replay is idempotent.
+    last_id = max((log["id"] for log in snapshot), default=0)
+    journal = [log for log in _read_journal(LOG_JOURNAL_FILE) if log["id"] > last_id]
+    data = snapshot + journal
+    # Older snapshots were stored newest first; sorting a reversed run is O(N).
+    data.sort(key=lambda log: log["id"])
+    save_log_database(data)
+    return data
 
 
 def save_log_database(data: List[Dict[str, Any]]):
-    """Save the action log to the JSON file."""
-    with open(LOG_DATABASE_FILE, "w") as f:
-        json.dump(data, f, indent=4, default=default_converter)
+    """Compact the action log into the JSON snapshot and reset the journal."""
+    _write_snapshot(LOG_DATABASE_FILE, data)
+    open(LOG_JOURNAL_FILE, "w").close()
+
+
+def append_log_record(log: Dict[str, Any]):
+    """Append a single new entry to the action log journal."""
+    with open(LOG_JOURNAL_FILE, "ab") as f:
+        f.write(orjson.dumps(log, option=JSON_OPTIONS) + b"\n")
+
+
+# --- Columnar Inventory View ---
+def _set_category(column: pd.Categorical, row: int, value: str) -> pd.Categorical:
+    """Set one value of a categorical column, adding its category if needed."""
+    if value not in column.categories:
+        # Categories stay sorted, as they are when the column is first built.
+        column = column.set_categories(sorted([*column.categories, value]))
+    column[row] = value
+    return column
+
+
+def _append_categories(column: pd.Categorical, values: List[str]) -> pd.Categorical:
+    """Return a categorical column with the given values appended."""
+    column = column.set_categories(sorted({*column.categories, *values}))
+    codes = pd.Categorical(values, categories=column.categories).codes
+    return pd.Categorical.from_codes(
+        np.concatenate([column.codes, codes]), dtype=column.dtype
+    )
+
+
+class Inventory:
+    """
+    Column-oriented (structure-of-arrays) view of the phone inventory.
+
+    Every attribute holds one field for all phones, row-aligned with the list
+    of phones it was built from. Brands and conditions are pandas Categoricals,
+    so filtering and grouping work on integer codes instead of strings.
+    Specifications, tags and the other free-form fields stay in the records.
+
+    The view is kept in step with the list of phones through append, set_row
+    and delete_row, so changes to the inventory do not need a full rebuild.
+    """
+
+    # Plain NumPy columns, which are appended to and deleted from alike.
+    ARRAY_COLUMNS = (
+        "ids",
+        "base_price",
+        "stock_quantity",
+        "inventory_value",
+        "listed_mask",
+    )
+
+    def __init__(self, phones: List[Dict[str, Any]]):
+        count = len(phones)
+        self.ids = np.fromiter((p["id"] for p in phones), dtype=np.int64, count=count)
+        self.base_price = np.fromiter(
+            (p["base_price"] for p in phones), dtype=np.float64, count=count
+        )
+        self.stock_quantity = np.fromiter(
+            (p["stock_quantity"] for p in phones), dtype=np.int64, count=count
+        )
+        self.inventory_value = self.base_price * self.stock_quantity
+        self.brand = pd.Categorical([p["brand"] for p in phones])
+        self.condition = pd.Categorical([p["condition"] for p in phones])
+        # Platforms each phone is listed on, packed as PLATFORM_BIT flags.
+        self.listed_mask = np.fromiter(
+            (sum(PLATFORM_BIT.get(x, 0) for x in p["listed_on"]) for p in phones),
+            dtype=np.uint8,
+            count=count,
+        )
+        # One price column per platform, NaN where there is no manual override.
+        self.overrides = {
+            x: np.array(
+                [p.get("manual_overrides", {}).get(x) for p in phones], dtype=float
+            )
+            for x in ["X", "Y", "Z"]
+        }
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def row(self, phone_id: int) -> int:
+        """Return the row of the phone with the given ID."""
+        # Phones are kept in ID order, so a binary search normally finds it.
+        row = int(np.searchsorted(self.ids, phone_id))
+        if row < len(self.ids) and self.ids[row] == phone_id:
+            return row
+        return int(np.flatnonzero(self.ids == phone_id)[0])
+
+    def set_row(self, row: int, phone: Dict[str, Any]):
+        """Refresh one row after the phone it was built from has changed."""
+        self.base_price[row] = phone["base_price"]
+        self.stock_quantity[row] = phone["stock_quantity"]
+        self.inventory_value[row] = self.base_price[row] * self.stock_quantity[row]
+        self.brand = _set_category(self.brand, row, phone["brand"])
+        self.condition = _set_category(self.condition, row, phone["condition"])
+        self.listed_mask[row] = sum(PLATFORM_BIT.get(x, 0) for x in phone["listed_on"])
+        for x, column in self.overrides.items():
+            value = phone.get("manual_overrides", {}).get(x)
+            column[row] = np.nan if value is None else value
+
+    def append(self, phones: List[Dict[str, Any]]):
+        """Add rows for phones appended to the list the view was built from."""
+        new = Inventory(phones)
+        for name in self.ARRAY_COLUMNS:
+            setattr(
+                self, name, np.concatenate([getattr(self, name), getattr(new, name)])
+            )
+        self.brand = _append_categories(self.brand, [p["brand"] for p in phones])
+        self.condition = _append_categories(
+            self.condition, [p["condition"] for p in phones]
+        )
+        for x in self.overrides:
+            self.overrides[x] = np.concatenate([self.overrides[x], new.overrides[x]])
+
+    def delete_row(self, row: int):
+        """Remove the row of a phone removed from the list."""
+        for name in self.ARRAY_COLUMNS:
+            setattr(self, name, np.delete(getattr(self, name), row))
+        self.brand = pd.Categorical.from_codes(
+            np.delete(self.brand.codes, row), dtype=self.brand.dtype
+        )
+        self.condition = pd.Categorical.from_codes(
+            np.delete(self.condition.codes, row), dtype=self.condition.dtype
+        )
+        for x in self.overrides:
+            self.overrides[x] = np.delete(self.overrides[x], row)
+
+    @staticmethod
+    def category_mask(column: pd.Categorical, value: str) -> np.ndarray:
+        """Return a row mask for a case-insensitive match on a categorical column."""
+        key = value.casefold()
+        codes = [i for i, c in enumerate(column.categories) if c.casefold() == key]
+        return np.isin(column.codes, codes)
+
+    def platform_mask(self, platform: str) -> np.ndarray:
+        """Return a row mask of the phones listed on a platform."""
+        # Phones can never be listed on an unknown platform.
+        bit = PLATFORM_BIT.get(platform, 0)
+        return (self.listed_mask & bit) != 0
+
+
+# --- Inverted Index Functions ---
+def index_phone(phone: Dict[str, Any]):
+    """Add a phone to the brand, condition and platform indexes."""
+    brand_index[phone["brand"].casefold()].add(phone["id"])
+    condition_index[phone["condition"].casefold()].add(phone["id"])
+    for platform in phone["listed_on"]:
+        platform_index[platform].add(phone["id"])
+
+
+def unindex_phone(phone: Dict[str, Any]):
+    """Remove a phone from the brand, condition and platform indexes."""
+    brand_index[phone["brand"].casefold()].discard(phone["id"])
+    condition_index[phone["condition"].casefold()].discard(phone["id"])
+    for platform in phone["listed_on"]:
+        platform_index[platform].discard(phone["id"])
 
 
 # Initialize databases
 db: List[Dict[str, Any]] = load_phone_database()
+db_by_id: Dict[int, Dict[str, Any]] = {p["id"]: p for p in db}
+
+# Phone IDs keyed by case-folded brand, case-folded condition and platform.
+brand_index: Dict[str, Set[int]] = defaultdict(set)
+condition_index: Dict[str, Set[int]] = defaultdict(set)
+platform_index: Dict[str, Set[int]] = defaultdict(set)
+for _phone in db:
+    index_phone(_phone)
 action_log_db: List[Dict[str, Any]] = load_log_database()
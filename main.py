@@ -11,21 +11,23 @@ from fastapi.templating import Jinja2Templates
 from fastapi.staticfiles import StaticFiles
 from fastapi.security import OAuth2PasswordBearer
 from fastapi.middleware.cors import CORSMiddleware
-from typing import List, Optional
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+import orjson
 import pandas as pd
-import io
 
+from database import JSON_OPTIONS
 from models import Phone, PhoneCreate, PhoneUpdate, ActionLog, PhonePage
 from services import (
     create_phone,
     update_phone,
     delete_phone,
     list_phone_on_platform,
-    search_and_filter_phones,
+    search_phone_records,
     update_platform_prices,
     bulk_upload_phones,
     get_dashboard_analytics,
-    get_action_logs,
+    get_action_log_records,
     bulk_list_on_platform,
 )
 from security import get_current_user
@@ -35,6 +37,8 @@ app = FastAPI(
     title="Refurbished Phone Selling API",
     description="An API to manage and sell refurbished phones on multiple e-commerce platforms.",
     version="1.0.0",
+    # Serialize every JSON response with orjson instead of the stdlib encoder.
+    default_response_class=ORJSONResponse,
 )
 
 # --- Static Files and Template Configuration ---
@@ -54,9 +58,48 @@ app.add_middleware(
     allow_headers=["*"],  # Allow all headers
 )
 
+# Number of CSV rows parsed per DataFrame chunk during bulk upload.
+CSV_CHUNK_SIZE = 5000
+
+# Number of records serialized per chunk of a streamed JSON response.
+STREAM_BATCH_SIZE = 500
+
 # --- Security and Authentication ---
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
+# --- JSON Streaming Helpers ---
+
+
+def _iter_json_array(items: Iterable[Dict[str, Any]]) -> Iterator[bytes]:
+    """
+    Serializes records into a JSON array piece by piece with orjson.
+
+    Records are encoded in batches of STREAM_BATCH_SIZE, so the full response
+    body is never built in memory.
+    """
+    yield b"["
+    batch = []
+    first = True
+    for item in items:
+        batch.append(orjson.dumps(item, option=JSON_OPTIONS))
+        if len(batch) == STREAM_BATCH_SIZE:
+            yield (b"" if first else b",") + b",".join(batch)
+            batch = []
+            first = False
+    if batch:
+        yield (b"" if first else b",") + b",".join(batch)
+    yield b"]"
+
+
+def _iter_json_page(
+    total_items: int, items: Iterable[Dict[str, Any]]
+) -> Iterator[bytes]:
+    """Serializes a page of records in the PhonePage shape."""
+    yield b'{"total_items":%d,"items":' % total_items
+    yield from _iter_json_array(items)
+    yield b"}"
+
+
 # --- Page Rendering Endpoints ---
 
 
@@ -92,7 +135,9 @@ def read_dashboard_analytics(
 @app.get("/logs", response_model=List[ActionLog], tags=["Logs"])
 def read_action_logs(current_user: str = Depends(get_current_user)):
     """Retrieves and returns the list of all recorded user actions."""
-    return get_action_logs()
+    return StreamingResponse(
+        _iter_json_array(get_action_log_records()), media_type="application/json"
+    )
 
 
 @app.get("/phones", response_model=PhonePage, tags=["Inventory"])
@@ -107,7 +152,10 @@ def read_phones(
     """
     Retrieves a paginated and filtered list of phones from the inventory.
     """
-    return search_and_filter_phones(brand, condition, platform, skip, limit)
+    total_items, items = search_phone_records(brand, condition, platform, skip, limit)
+    return StreamingResponse(
+        _iter_json_page(total_items, items), media_type="application/json"
+    )
 
 
 @app.post("/phones", response_model=Phone, status_code=201, tags=["Inventory"])
@@ -139,16 +187,24 @@ def remove_phone(phone_id: int, current_user: str = Depends(get_current_user)):
 
 
 @app.post("/phones/upload", tags=["Inventory"])
-async def upload_phones_csv(
+def upload_phones_csv(
     file: UploadFile = File(...), current_user: str = Depends(get_current_user)
 ):
-    """Allows bulk uploading of phone data from a CSV file."""
-    contents = await file.read()
+    """
+    Allows bulk uploading of phone data from a CSV file.
+
+    The file is parsed by pandas in chunks of CSV_CHUNK_SIZE rows, so only one
+    DataFrame chunk is held in memory at a time. Every row is validated before
+    any phone is stored, so an invalid row rejects the whole file.
+    """
     try:
-        df = pd.read_csv(io.StringIO(contents.decode("utf-8")))
-        phones_data = df.to_dict(orient="records")
-        bulk_upload_phones(phones_data)
-        return {"message": f"{len(phones_data)} phones uploaded successfully"}
+        phones_data = (
+            row
+            for chunk in pd.read_csv(file.file, chunksize=CSV_CHUNK_SIZE)
+            for row in chunk.to_dict(orient="records")
+        )
+        uploaded = bulk_upload_phones(phones_data)
+        return {"message": f"{uploaded} phones uploaded successfully"}
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Failed to process CSV file: {e}")
 
@@ -197,5 +253,7 @@ def login_for_access_token(username: str = "admin", password: str = "password"):
 if __name__ == "__main__":
     import uvicorn
 
-    # This block allows running the server directly with `python main.py`
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    # This block allows running the server directly with `python main.py`.
+    # A single worker is used on purpose: the inventory and its indexes live in
+    # process memory, and the journals are appended to by that one process.
+    uvicorn.run(app, host="0.0.0.0", port=8000, loop="uvloop", http="httptools")
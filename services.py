@@ -7,11 +7,45 @@ managing inventory, and generating analytics. It acts as a service layer,
 separating the API routing from the data manipulation.
 """
 
-import json
-from typing import List, Dict, Any, Optional
-from database import db, save_phone_database, action_log_db, save_log_database
-from models import Phone, ActionLog, PhonePage
-from utils import map_condition_to_platform, calculate_platform_price
+import heapq
+import math
+import threading
+import numpy as np
+import orjson
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Set, Tuple
+from database import (
+    db,
+    db_by_id,
+    brand_index,
+    condition_index,
+    platform_index,
+    index_phone,
+    unindex_phone,
+    Inventory,
+    PLATFORM_BIT,
+    save_phone_database,
+    append_phone_record,
+    append_phone_records,
+    action_log_db,
+    append_log_record,
+)
+from models import Phone, PhoneCreate, ActionLog
+from utils import map_condition_to_platform, calculate_platform_price, PLATFORM_FEES
+
+# Highest phone ID handed out so far, so creating a phone needs no inventory scan.
+_max_id: int = max(db_by_id, default=0)
+
+# ID of the next action log entry, so logging needs no scan of the log.
+_next_log_id: int = action_log_db[-1]["id"] + 1 if action_log_db else 1
+
+# FastAPI runs the sync endpoints concurrently in its threadpool, so handing
+# out IDs, changing the inventory and reading the columnar view must all
+# happen under this lock.
+_lock = threading.Lock()
+
+# Columnar view of the inventory used by the analytics and price updates. It is
+# built on first use and then updated in place along with the inventory.
+_inventory: Optional[Inventory] = None
 
 # --- Helper Functions ---
 
@@ -31,49 +65,140 @@ def _ensure_specifications_is_dict(phone_data: Dict[str, Any]) -> Dict[str, Any]
     """
     if "specifications" in phone_data and isinstance(phone_data["specifications"], str):
         try:
-            phone_data["specifications"] = json.loads(phone_data["specifications"])
-        except json.JSONDecodeError:
+            phone_data["specifications"] = orjson.loads(phone_data["specifications"])
+        except orjson.JSONDecodeError:
             # If parsing fails, default to an empty dict to prevent crashes.
             phone_data["specifications"] = {}
     return phone_data
 
 
-# --- Action Logging Service ---
+def _get_inventory() -> Inventory:
+    """
+    Returns the cached columnar view of the inventory, building it if needed.
 
+    Must be called with _lock held.
+    """
+    global _inventory
+    if _inventory is None:
+        _inventory = Inventory(db)
+    return _inventory
 
-def log_action(action: str, details: str):
+
+def _build_phone(phone_data: Dict[str, Any], phone_id: int) -> Dict[str, Any]:
     """
-    Records an action to the action log database.
+    Builds the stored record for a new phone without touching the database.
 
     Args:
-        action: The type of action performed (e.g., "Phone Created").
-        details: A human-readable description of the action.
+        phone_data: A dictionary of the new phone's attributes.
+        phone_id: The ID to assign to the new phone.
+
+    Returns:
+        The new phone dictionary, with platform prices calculated.
+    """
+    phone_data = _ensure_specifications_is_dict(phone_data)
+    new_phone = {
+        "id": phone_id,
+        **phone_data,
+        "platform_prices": {},
+        "manual_overrides": {},
+        "listed_on": [],
+        "tags": [],
+    }
+    new_phone["platform_prices"] = {
+        p: calculate_platform_price(new_phone["base_price"], p, None)
+        for p in ["X", "Y", "Z"]
+    }
+    return new_phone
+
+
+def _validate_upload_row(row: Dict[str, Any]) -> Dict[str, Any]:
     """
-    log_id = max([log["id"] for log in action_log_db]) + 1 if action_log_db else 1
-    new_log = ActionLog(id=log_id, action=action, details=details)
-    action_log_db.insert(
-        0, new_log.dict()
-    )  # Insert at the beginning for chronological order
-    save_log_database(action_log_db)
+    Validates one uploaded CSV row the same way the API validates a new phone.
 
+    Blank CSV cells arrive from pandas as NaN and are treated as missing, so
+    they are reported as validation errors instead of being stored.
 
-# --- Phone CRUD and Management Services ---
+    Args:
+        row: A dictionary of the row's raw values.
 
+    Returns:
+        The validated phone attributes.
+    """
+    row = {k: v for k, v in row.items() if not (isinstance(v, float) and math.isnan(v))}
+    return PhoneCreate(**_ensure_specifications_is_dict(row)).dict()
 
-def get_phone_by_id(phone_id: int) -> Optional[Phone]:
+
+def _store_phones(new_phones: List[Dict[str, Any]]):
     """
-    Retrieves a single phone from the database by its unique ID.
+    Adds newly built phones to the database and journals them in one write.
+
+    The journal is written first, so a failed write leaves the in-memory
+    inventory untouched. Must be called with _lock held, together with the
+    allocation of the phones' IDs.
 
     Args:
-        phone_id: The ID of the phone to retrieve.
+        new_phones: Validated phone dictionaries as returned by _build_phone.
+    """
+    append_phone_records([{"op": "put", "id": p["id"], "data": p} for p in new_phones])
+    db.extend(new_phones)
+    for phone in new_phones:
+        db_by_id[phone["id"]] = phone
+        index_phone(phone)
+    if _inventory is not None:
+        _inventory.append(new_phones)
+
+
+def _matching_ids(
+    brand: Optional[str], condition: Optional[str], platform: Optional[str]
+) -> Optional[Set[int]]:
+    """
+    Finds the IDs of phones matching all given filters using the inverted indexes.
+
+    Args:
+        brand: The brand to filter by (case-insensitive).
+        condition: The condition to filter by (case-insensitive).
+        platform: The platform to filter by.
 
     Returns:
-        A Pydantic Phone model instance if found, otherwise None.
+        The set of matching phone IDs, or None if no filter was given. With a
+        single filter this is the index set itself and must not be modified.
     """
-    for phone in db:
-        if phone["id"] == phone_id:
-            return Phone(**_ensure_specifications_is_dict(phone))
-    return None
+    filters = []
+    if brand:
+        filters.append(brand_index.get(brand.casefold(), set()))
+    if condition:
+        filters.append(condition_index.get(condition.casefold(), set()))
+    if platform:
+        filters.append(platform_index.get(platform, set()))
+    if not filters:
+        return None
+    if len(filters) == 1:
+        return filters[0]
+    # Start from the smallest set so each intersection step stays small.
+    filters.sort(key=len)
+    return filters[0].intersection(*filters[1:])
+
+
+# --- Action Logging Service ---
+
+
+def log_action(action: str, details: str):
+    """
+    Records an action to the action log database.
+
+    Args:
+        action: The type of action performed (e.g., "Phone Created").
+        details: A human-readable description of the action.
+    """
+    global _next_log_id
+    with _lock:
+        new_log = ActionLog(id=_next_log_id, action=action, details=details)
+        _next_log_id += 1
+        action_log_db.append(new_log.dict())  # Kept oldest first, reversed on read
+        append_log_record(action_log_db[-1])
+
+
+# --- Phone CRUD and Management Services ---
 
 
 def create_phone(phone_data: Dict[str, Any]) -> Phone:
@@ -86,27 +211,13 @@ def create_phone(phone_data: Dict[str, Any]) -> Phone:
     Returns:
         A Pydantic Phone model instance of the newly created phone.
     """
-    phone_id = max([p["id"] for p in db]) + 1 if db else 1
-    phone_data = _ensure_specifications_is_dict(phone_data)
+    global _max_id
+    with _lock:
+        new_phone = _build_phone(phone_data, _max_id + 1)
+        _store_phones([new_phone])
+        _max_id += 1
 
-    new_phone = {
-        "id": phone_id,
-        **phone_data,
-        "platform_prices": {},
-        "manual_overrides": {},
-        "listed_on": [],
-        "tags": [],
-    }
-    new_phone["platform_prices"] = {
-        p: calculate_platform_price(
-            new_phone["base_price"], p, new_phone["manual_overrides"]
-        )
-        for p in ["X", "Y", "Z"]
-    }
-
-    db.append(new_phone)
-    save_phone_database(db)
-    log_action("Phone Created", f"New phone '{phone_data['model_name']}' was added.")
+    log_action("Phone Created", f"New phone '{new_phone['model_name']}' was added.")
     return Phone(**new_phone)
 
 
@@ -121,30 +232,36 @@ def update_phone(phone_id: int, phone_update: Dict[str, Any]) -> Optional[Phone]
     Returns:
         The updated Pydantic Phone model instance, or None if not found.
     """
-    for phone in db:
-        if phone["id"] == phone_id:
-            # Handle nested dictionary updates separately to avoid overwriting.
-            if "manual_overrides" in phone_update:
-                phone["manual_overrides"] = phone_update["manual_overrides"]
-                del phone_update["manual_overrides"]
+    with _lock:
+        phone = db_by_id.get(phone_id)
+        if phone is None:
+            return None
 
-            phone.update(phone_update)
+        # Handle nested dictionary updates separately to avoid overwriting.
+        if "manual_overrides" in phone_update:
+            phone["manual_overrides"] = phone_update["manual_overrides"]
+            del phone_update["manual_overrides"]
 
-            # Recalculate prices if the base price or overrides have changed.
-            phone["platform_prices"] = {
-                p: calculate_platform_price(
-                    phone["base_price"], p, phone["manual_overrides"]
-                )
-                for p in ["X", "Y", "Z"]
-            }
+        unindex_phone(phone)
+        phone.update(phone_update)
+        index_phone(phone)
 
-            save_phone_database(db)
-            log_action(
-                "Phone Updated",
-                f"Phone ID {phone_id} ('{phone['model_name']}') was updated.",
+        # Recalculate prices if the base price or overrides have changed.
+        phone["platform_prices"] = {
+            p: calculate_platform_price(
+                phone["base_price"], p, phone["manual_overrides"].get(p)
             )
-            return Phone(**_ensure_specifications_is_dict(phone))
-    return None
+            for p in ["X", "Y", "Z"]
+        }
+
+        if _inventory is not None:
+            _inventory.set_row(_inventory.row(phone_id), phone)
+        append_phone_record({"op": "put", "id": phone_id, "data": phone})
+    log_action(
+        "Phone Updated",
+        f"Phone ID {phone_id} ('{phone['model_name']}') was updated.",
+    )
+    return Phone(**phone)
 
 
 def delete_phone(phone_id: int) -> bool:
@@ -157,16 +274,19 @@ def delete_phone(phone_id: int) -> bool:
     Returns:
         True if the deletion was successful, False otherwise.
     """
-    phone_to_delete = next((p for p in db if p["id"] == phone_id), None)
-    if phone_to_delete:
-        model_name = phone_to_delete["model_name"]
+    with _lock:
+        phone_to_delete = db_by_id.pop(phone_id, None)
+        if phone_to_delete is None:
+            return False
+        if _inventory is not None:
+            _inventory.delete_row(_inventory.row(phone_id))
         db.remove(phone_to_delete)
-        save_phone_database(db)
-        log_action(
-            "Phone Deleted", f"Phone '{model_name}' (ID: {phone_id}) was deleted."
-        )
-        return True
-    return False
+        unindex_phone(phone_to_delete)
+        append_phone_record({"op": "del", "id": phone_id})
+
+    model_name = phone_to_delete["model_name"]
+    log_action("Phone Deleted", f"Phone '{model_name}' (ID: {phone_id}) was deleted.")
+    return True
 
 
 def list_phone_on_platform(phone_id: int, platform: str) -> Dict[str, Any]:
@@ -180,46 +300,58 @@ def list_phone_on_platform(phone_id: int, platform: str) -> Dict[str, Any]:
     Returns:
         A dictionary with a success message or an error message.
     """
-    phone = get_phone_by_id(phone_id)
-    if not phone:
-        return {"error": "Phone not found"}
-    if phone.stock_quantity == 0:
-        return {"error": "Cannot list out-of-stock phone"}
-
-    platform_condition = map_condition_to_platform(phone.condition, platform)
-    if not platform_condition:
-        return {"error": f"Condition '{phone.condition}' not supported on {platform}"}
-
-    # Profitability check example
-    if platform == "X" and phone.base_price < 50:
-        return {"error": "Listing fee too high for this phone on platform X"}
-
-    if platform not in phone.listed_on:
-        phone.listed_on.append(platform)
-        # Update the raw dictionary in the database
-        for phone_dict in db:
-            if phone_dict["id"] == phone_id:
-                phone_dict["listed_on"] = phone.listed_on
-                save_phone_database(db)
-                break
+    with _lock:
+        phone = db_by_id.get(phone_id)
+        if phone is None:
+            return {"error": "Phone not found"}
+        if phone["stock_quantity"] == 0:
+            return {"error": "Cannot list out-of-stock phone"}
+
+        platform_condition = map_condition_to_platform(phone["condition"], platform)
+        if not platform_condition:
+            return {
+                "error": f"Condition '{phone['condition']}' not supported on {platform}"
+            }
+
+        # Profitability check example
+        if platform == "X" and phone["base_price"] < 50:
+            return {"error": "Listing fee too high for this phone on platform X"}
+
+        newly_listed = phone_id not in platform_index.get(platform, ())
+        if newly_listed:
+            phone["listed_on"].append(platform)
+            platform_index[platform].add(phone_id)
+            if _inventory is not None:
+                row = _inventory.row(phone_id)
+                _inventory.listed_mask[row] |= PLATFORM_BIT[platform]
+            append_phone_record(
+                {
+                    "op": "patch",
+                    "id": phone_id,
+                    "data": {"listed_on": phone["listed_on"]},
+                }
+            )
+
+    if newly_listed:
         log_action(
-            "Platform Listing", f"'{phone.model_name}' listed on platform {platform}."
+            "Platform Listing",
+            f"'{phone['model_name']}' listed on platform {platform}.",
         )
 
     return {
-        "message": f"Successfully listed '{phone.model_name}' on platform {platform}"
+        "message": f"Successfully listed '{phone['model_name']}' on platform {platform}"
     }
 
 
-def search_and_filter_phones(
+def search_phone_records(
     brand: Optional[str],
     condition: Optional[str],
     platform: Optional[str],
     skip: int = 0,
     limit: int = 15,
-) -> PhonePage:
+) -> Tuple[int, List[Dict[str, Any]]]:
     """
-    Searches, filters, and paginates the phone inventory.
+    Searches, filters, and paginates the phone inventory, returning raw records.
 
     Args:
         brand: The brand to filter by.
@@ -229,22 +361,21 @@ def search_and_filter_phones(
         limit: The maximum number of items to return.
 
     Returns:
-        A PhonePage object containing the list of phones and the total count.
+        A tuple of the total number of matching phones and the phone
+        dictionaries on the requested page.
     """
-    results = db
-    if brand:
-        results = [p for p in results if p["brand"].lower() == brand.lower()]
-    if condition:
-        results = [p for p in results if p["condition"].lower() == condition.lower()]
-    if platform:
-        results = [p for p in results if platform in p["listed_on"]]
+    ids = _matching_ids(brand, condition, platform)
+    if ids is None:
+        total_items = len(db)
+        paginated_results = db[skip : skip + limit]
+    else:
+        # IDs grow monotonically, so ID order is the inventory order. Only the
+        # IDs up to the end of the requested page are selected and sorted.
+        total_items = len(ids)
+        page_ids = heapq.nsmallest(skip + limit, ids)[skip:]
+        paginated_results = [db_by_id[i] for i in page_ids]
 
-    total_items = len(results)
-    paginated_results = results[skip : skip + limit]
-
-    items = [Phone(**_ensure_specifications_is_dict(p)) for p in paginated_results]
-
-    return PhonePage(total_items=total_items, items=items)
+    return total_items, paginated_results
 
 
 def bulk_list_on_platform(
@@ -261,14 +392,16 @@ def bulk_list_on_platform(
     Returns:
         A dictionary with the count of successful and failed listings.
     """
-    phone_page = search_and_filter_phones(brand, condition, None, skip=0, limit=len(db))
-    phones_to_list = phone_page.items
+    with _lock:
+        ids = _matching_ids(brand, condition, None)
+        # Sorted copy, so listing can safely add to the indexes while iterating.
+        phone_ids = sorted(db_by_id if ids is None else ids)
 
     success_count = 0
     fail_count = 0
-    for phone in phones_to_list:
-        if platform not in phone.listed_on:
-            result = list_phone_on_platform(phone.id, platform)
+    for phone_id in phone_ids:
+        if phone_id not in platform_index.get(platform, ()):
+            result = list_phone_on_platform(phone_id, platform)
             if "error" in result:
                 fail_count += 1
             else:
@@ -282,31 +415,66 @@ def bulk_list_on_platform(
 
 
 def update_platform_prices():
-    """Triggers a recalculation of all platform prices for all phones."""
-    for phone in db:
-        phone["platform_prices"] = {
-            p: calculate_platform_price(
-                phone["base_price"], p, phone.get("manual_overrides", {})
-            )
-            for p in ["X", "Y", "Z"]
-        }
-    save_phone_database(db)
+    """
+    Triggers a recalculation of all platform prices for all phones.
+
+    Fees are applied column-wise over the whole inventory with NumPy, one
+    vector operation per platform. Rounding happens while writing the prices
+    back, with Python's round() as in calculate_platform_price, since
+    np.round can differ from it in the last cent.
+    """
+    with _lock:
+        inventory = _get_inventory()
+        calculated = {}
+        overrides = {}
+        for platform, (multiplier, fixed_fee) in PLATFORM_FEES.items():
+            calculated[platform] = (
+                inventory.base_price * multiplier + fixed_fee
+            ).tolist()
+            overrides[platform] = inventory.overrides[platform].tolist()
+
+        for i, phone in enumerate(db):
+            phone["platform_prices"] = {
+                p: (
+                    round(calculated[p][i], 2)
+                    if math.isnan(overrides[p][i])
+                    else overrides[p][i]
+                )
+                for p in PLATFORM_FEES
+            }
+        save_phone_database(db)
     log_action("Price Update", "Automatic price update triggered for all phones.")
 
 
-def bulk_upload_phones(phones_data: List[Dict[str, Any]]):
+def bulk_upload_phones(phones_data: Iterable[Dict[str, Any]]) -> int:
     """
-    Adds multiple phones to the inventory from a list of dictionaries (from CSV).
+    Adds multiple phones to the inventory from dictionaries (from CSV).
+
+    Every row is validated before anything is stored, so an invalid row
+    rejects the whole batch without changing the inventory. The batch is then
+    given its IDs, stored and journaled together, with a single summary log
+    entry.
 
     Args:
-        phones_data: A list of phone data dictionaries.
+        phones_data: An iterable of phone data dictionaries, such as the rows
+            of a CSV file read in chunks.
+
+    Returns:
+        The number of phones added.
     """
-    count = 0
-    for phone_data in phones_data:
-        phone_data = _ensure_specifications_is_dict(phone_data)
-        create_phone(phone_data)
-        count += 1
-    log_action("Bulk Upload", f"{count} phones were added via bulk upload.")
+    global _max_id
+    validated = [_validate_upload_row(phone_data) for phone_data in phones_data]
+
+    with _lock:
+        next_id = _max_id + 1
+        new_phones = [
+            _build_phone(phone_data, next_id + i)
+            for i, phone_data in enumerate(validated)
+        ]
+        _store_phones(new_phones)
+        _max_id += len(new_phones)
+    log_action("Bulk Upload", f"{len(new_phones)} phones were added via bulk upload.")
+    return len(new_phones)
 
 
 # --- Analytics and Log Services ---
@@ -326,40 +494,50 @@ def get_dashboard_analytics(
     Returns:
         A dictionary containing various analytics metrics.
     """
-    results = db
-    if brand:
-        results = [p for p in results if p["brand"].lower() == brand.lower()]
-    if condition:
-        results = [p for p in results if p["condition"].lower() == condition.lower()]
-    if platform:
-        results = [p for p in results if platform in p["listed_on"]]
+    with _lock:
+        inventory = _get_inventory()
+        mask = np.ones(len(inventory), dtype=bool)
+        if brand:
+            mask &= Inventory.category_mask(inventory.brand, brand)
+        if condition:
+            mask &= Inventory.category_mask(inventory.condition, condition)
+        if platform:
+            mask &= inventory.platform_mask(platform)
+        total_phones = int(np.count_nonzero(mask))
+
+        if not total_phones:
+            return {
+                "total_phones": 0,
+                "total_stock_units": 0,
+                "total_inventory_value": 0,
+                "stock_by_brand": {},
+                "stock_by_condition": {},
+            }
+
+        # Count matches per category code in one pass over each code column.
+        brand_counts = np.bincount(
+            inventory.brand.codes[mask], minlength=len(inventory.brand.categories)
+        )
+        condition_counts = np.bincount(
+            inventory.condition.codes[mask],
+            minlength=len(inventory.condition.categories),
+        )
 
-    if not results:
         return {
-            "total_phones": 0,
-            "total_stock_units": 0,
-            "total_inventory_value": 0,
-            "stock_by_brand": {},
-            "stock_by_condition": {},
+            "total_phones": total_phones,
+            "total_stock_units": int(inventory.stock_quantity[mask].sum()),
+            "total_inventory_value": float(inventory.inventory_value[mask].sum()),
+            "stock_by_brand": {
+                b: int(n) for b, n in zip(inventory.brand.categories, brand_counts) if n
+            },
+            "stock_by_condition": {
+                c: int(n)
+                for c, n in zip(inventory.condition.categories, condition_counts)
+                if n
+            },
         }
 
-    brands = [p["brand"] for p in results]
-    stock_by_brand = {b: brands.count(b) for b in set(brands)}
-
-    conditions = [p["condition"] for p in results]
-    stock_by_condition = {c: conditions.count(c) for c in set(conditions)}
-
-    total_inventory_value = sum(p["base_price"] * p["stock_quantity"] for p in results)
-
-    return {
-        "total_phones": len(results),
-        "total_stock_units": sum(p["stock_quantity"] for p in results),
-        "total_inventory_value": total_inventory_value,
-        "stock_by_brand": stock_by_brand,
-        "stock_by_condition": stock_by_condition,
-    }
-
 
-def get_action_logs() -> List[ActionLog]:
-    """Retrieves all action logs from the database."""
-    return [ActionLog(**log) for log in action_log_db]
+def get_action_log_records() -> Iterator[Dict[str, Any]]:
+    """Iterates over the raw action log entries, newest first."""
+    return reversed(action_log_db)
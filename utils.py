@@ -6,46 +6,43 @@ such as calculating platform-specific prices and mapping internal conditions
 to platform-specific categories. This keeps the main services logic cleaner.
 """
 
-from typing import Optional, Dict
+import functools
+from typing import Optional
 
+# Fee structure of each platform as (price multiplier, fixed fee).
+PLATFORM_FEES = {
+    "X": (1.10, 0.0),  # 10% fee
+    "Y": (1.08, 2.0),  # 8% fee + $2 fixed fee
+    "Z": (1.12, 0.0),  # 12% fee
+}
 
+
+@functools.lru_cache(maxsize=4096)
 def calculate_platform_price(
-    base_price: float, platform: str, manual_overrides: Dict[str, Optional[float]]
+    base_price: float, platform: str, override: Optional[float]
 ) -> float:
     """
     Calculates the selling price on a specific platform based on its fee structure.
 
-    It first checks for a manual price override for the given platform. If one
-    exists, it is used. Otherwise, it calculates the price based on the
-    platform's unique fee rules.
+    If a manual price override is given for the platform, it is used as is.
+    Otherwise, the price is calculated from the platform's fee rules. Results
+    are memoized, since many phones share the same base price.
 
     Args:
         base_price: The base price of the phone.
         platform: The platform to calculate the price for ('X', 'Y', 'Z').
-        manual_overrides: A dictionary of manually set prices.
+        override: The manually set price for this platform, if any.
 
     Returns:
         The calculated platform-specific price, rounded to 2 decimal places.
     """
     # Check for a manual override first
-    if platform in manual_overrides and manual_overrides[platform] is not None:
-        return manual_overrides[platform]
-
-    # If no override, calculate based on the platform's fee structure
-    if platform == "X":
-        # 10% fee
-        price = base_price * 1.10
-    elif platform == "Y":
-        # 8% fee + $2 fixed fee
-        price = (base_price * 1.08) + 2.0
-    elif platform == "Z":
-        # 12% fee
-        price = base_price * 1.12
-    else:
-        # Default to base price if the platform is unknown
-        price = base_price
+    if override is not None:
+        return override
 
-    return round(price, 2)
+    # Default to base price if the platform is unknown
+    multiplier, fixed_fee = PLATFORM_FEES.get(platform, (1.0, 0.0))
+    return round(base_price * multiplier + fixed_fee, 2)
 
 
 def map_condition_to_platform(internal_condition: str, platform: str) -> Optional[str]: